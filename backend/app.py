@@ -1,19 +1,32 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-from werkzeug.security import generate_password_hash, check_password_hash
 import os
-import joblib
-import pandas as pd
+import functools
+import threading
 import numpy as np
+import orjson
 import requests
+from cachetools import TTLCache
 
+from auth import hash_password, verify_password
 from db import get_db, init_db
+from scipy.spatial import cKDTree
+
+from route_scoring import pack_cell_keys, unpack_cell_keys, nearest_cells, score_route_points
 
 # ======================================================
 # APP SETUP
 # ======================================================
 app = Flask(__name__)
-CORS(app)
+app.url_map.strict_slashes = False
+app.json.sort_keys = False
+
+# Comma-separated list of allowed frontend origins, e.g.
+# CORS_ORIGINS="https://safewalk.example.com,http://localhost:5173".
+# Preflight responses are cached by the browser for a day so the
+# high-frequency GPS pings don't each pay for an OPTIONS round trip.
+CORS_ORIGINS = [o.strip() for o in os.environ.get("CORS_ORIGINS", "").split(",") if o.strip()]
+CORS(app, resources={r"/api/*": {"origins": CORS_ORIGINS or "*"}}, max_age=86400)
 
 init_db()
 
@@ -24,21 +37,61 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "data")
 
 MODEL_PATH = os.path.join(BASE_DIR, "safety_model.pkl")
+# Coefficients written by train_safety_model.py; preferred over the pickle
+# since serving them needs neither sklearn nor unpickling
+MODEL_JSON_PATH = os.path.join(BASE_DIR, "safety_model.json")
 GRID_PATH = os.path.join(DATA_DIR, "grid_features.csv")
+# Written by generate_grid_features.py; preferred over the CSV when present
+CELL_KEYS_PATH = os.path.join(DATA_DIR, "cell_keys.npy")
+FEATS_PATH = os.path.join(DATA_DIR, "feats.npy")
 
 # ======================================================
 # ML LOAD
 # ======================================================
 safety_model = None
-grid_df = None
+# Sorted packed int64 cell keys and the matching (N, 3) feature rows
+# [incident_count, camera_count, police_count]. Memory-mapped from the
+# .npy feature store so server workers share the same pages.
+GRID_KEYS = None
+GRID_FEATS = None
+# KD-tree over the cell centres, used when a point's own cell has no data
+GRID_TREE = None
+# Linear models are scored inline as X @ MODEL_COEF + MODEL_BIAS, skipping
+# sklearn's per-call input validation. None for other model types. A model
+# loaded from safety_model.json is a plain {"coef", "intercept"} dict.
+MODEL_COEF = None
+MODEL_BIAS = None
+# The model only sees per-cell features, so each cell has exactly one
+# possible score: SCORE_TABLE[i] is the clipped score of GRID_KEYS[i] and
+# MISS_SCORE the score of a cell with no data. Rebuilt by load_ml(). Kept in
+# float64: float32 moves scores near a .xx5 boundary across it.
+SCORE_TABLE = None
+MISS_SCORE = None
+# Bumped by load_ml() once the new grid and table are in place; part of
+# the _cell_index() cache key so rows cached against an older grid are
+# never served for the new one.
+GRID_GENERATION = 0
 
 GRID_STEP = 0.0015
 
 
+def predict_scores(X):
+    """Raw (unclipped) model output for an (n, 3) feature matrix."""
+    if MODEL_COEF is not None:
+        return np.asarray(X, dtype=np.float64) @ MODEL_COEF + MODEL_BIAS
+    return safety_model.predict(X)
+
+
 def load_ml():
-    global safety_model, grid_df
+    global safety_model, GRID_KEYS, GRID_FEATS, MODEL_COEF, MODEL_BIAS
+    global SCORE_TABLE, MISS_SCORE, GRID_TREE, GRID_GENERATION
     try:
-        if os.path.exists(MODEL_PATH):
+        if os.path.exists(MODEL_JSON_PATH):
+            with open(MODEL_JSON_PATH, "rb") as f:
+                safety_model = orjson.loads(f.read())
+            print("✅ Safety model loaded (coefficients)")
+        elif os.path.exists(MODEL_PATH):
+            import joblib
             # Try loading with different compatibility options
             try:
                 # First try standard joblib load
@@ -72,19 +125,66 @@ def load_ml():
             print("❌ Safety model file not found:", MODEL_PATH)
             safety_model = None
 
-        if os.path.exists(GRID_PATH):
-            grid_df = pd.read_csv(GRID_PATH)
-            print(f"✅ Grid features loaded: {len(grid_df)} cells")
+        if isinstance(safety_model, dict):
+            MODEL_COEF = np.asarray(safety_model["coef"], dtype=np.float64).ravel()
+            MODEL_BIAS = float(safety_model["intercept"])
+        elif safety_model is not None and hasattr(safety_model, "coef_"):
+            MODEL_COEF = np.asarray(safety_model.coef_, dtype=np.float64).ravel()
+            MODEL_BIAS = float(np.ravel(safety_model.intercept_)[0])
+        else:
+            MODEL_COEF = None
+            MODEL_BIAS = None
+
+        if all(os.path.exists(p) for p in (CELL_KEYS_PATH, FEATS_PATH)):
+            GRID_KEYS = np.load(CELL_KEYS_PATH, mmap_mode="r")
+            GRID_FEATS = np.load(FEATS_PATH, mmap_mode="r")
+            print(f"✅ Grid features loaded: {len(GRID_KEYS)} cells (memory-mapped)")
+        elif os.path.exists(GRID_PATH):
+            grid = np.atleast_1d(np.genfromtxt(GRID_PATH, delimiter=",", names=True))
+            keys = pack_cell_keys(grid["cell_lat"], grid["cell_lon"], GRID_STEP)
+            order = np.argsort(keys)
+            GRID_KEYS = keys[order]
+            GRID_FEATS = np.stack([
+                grid["incident_count"],
+                grid["camera_count"],
+                grid["police_count"],
+            ], axis=1).astype(np.float32)[order]
+            # Read-only, like the memory-mapped store
+            GRID_KEYS.setflags(write=False)
+            GRID_FEATS.setflags(write=False)
+            print(f"✅ Grid features loaded: {len(grid)} cells")
         else:
             print("⚠️ grid_features.csv not found – run generate_grid_features.py to create it")
-            grid_df = None
+            GRID_KEYS = None
+            GRID_FEATS = None
+
+        if GRID_KEYS is not None and len(GRID_KEYS) > 0:
+            GRID_TREE = cKDTree(unpack_cell_keys(GRID_KEYS, GRID_STEP))
+        else:
+            GRID_TREE = None
+
+        if safety_model is not None and GRID_KEYS is not None:
+            features = np.asarray(GRID_FEATS, dtype=np.float32)
+            SCORE_TABLE = np.clip(predict_scores(features), 1, 10)
+            MISS_SCORE = float(np.clip(predict_scores(np.zeros((1, 3))), 1, 10)[0])
+        else:
+            SCORE_TABLE = None
+            MISS_SCORE = None
 
     except Exception as e:
         print(f"❌ ML load failed: {e}")
         import traceback
         traceback.print_exc()
         safety_model = None
-        # Don't set grid_df to None here, let it try to load separately
+        MODEL_COEF = None
+        MODEL_BIAS = None
+        SCORE_TABLE = None
+        MISS_SCORE = None
+        # Don't reset the grid here, let it try to load separately
+
+    # Only after everything above is swapped in: a lookup that saw the old
+    # generation may still cache a row against it, but never against this one
+    GRID_GENERATION += 1
 
 
 load_ml()
@@ -99,26 +199,43 @@ def make_cell(lat, lng):
     )
 
 
-def get_cell_features(lat, lon):
-    """Return [crime_score, camera_count, police_score]."""
-    if grid_df is None:
-        return [0.0, 0.0, 0.0]
+@functools.lru_cache(maxsize=65536)
+def _cell_index(cell_lat, cell_lon, generation):
+    """Row of the grid cell in GRID_KEYS, or -1 if there's no data near it.
 
-    cell = make_cell(lat, lon)
-    row = grid_df[
-        (grid_df["cell_lat"] == cell[0]) & (grid_df["cell_lon"] == cell[1])
-    ]
+    Exact hits come from a binary search; cells outside the grid fall back
+    to the nearest known cell within 2 * GRID_STEP. Consecutive live-GPS
+    fixes almost always land in the same cell, so most calls are a cache
+    hit. ``generation`` is GRID_GENERATION, so a reload starts a fresh set
+    of cache entries.
+    """
+    if GRID_KEYS is None or len(GRID_KEYS) == 0:
+        return -1
 
-    if row.empty:
-        return [0.0, 0.0, 0.0]
+    key = pack_cell_keys(cell_lat, cell_lon, GRID_STEP)
+    pos = int(np.searchsorted(GRID_KEYS, key))
+    if pos < len(GRID_KEYS) and GRID_KEYS[pos] == key:
+        return pos
+    return int(nearest_cells(GRID_TREE, np.array([[cell_lat, cell_lon]]), GRID_STEP)[0])
 
-    r = row.iloc[0]
 
-    crime_score = float(r["incident_count"])
-    camera_count = float(r["camera_count"])
-    police_score = float(r["police_count"])
+def _lookup_cell(lat, lon):
+    cell_lat, cell_lon = make_cell(lat, lon)
+    return _cell_index(round(cell_lat, 6), round(cell_lon, 6), GRID_GENERATION)
 
-    return [crime_score, camera_count, police_score]
+
+def get_cell_score(lat, lon):
+    """Clipped safety score of the grid cell containing (lat, lon)."""
+    pos = _lookup_cell(lat, lon)
+    return float(SCORE_TABLE[pos]) if pos >= 0 else MISS_SCORE
+
+def orjson_response(payload, status=200):
+    """JSON response serialized with orjson; accepts NumPy arrays directly."""
+    return app.response_class(
+        orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY),
+        status=status,
+        mimetype="application/json",
+    )
 
 # ======================================================
 # ROOT
@@ -128,7 +245,7 @@ def home():
     status = {
         "status": "✅ SafeWalk Backend Running",
         "model_loaded": safety_model is not None,
-        "grid_loaded": grid_df is not None,
+        "grid_loaded": GRID_KEYS is not None,
         "route_proxy": "available"
     }
     return jsonify(status)
@@ -150,17 +267,17 @@ def signup():
     if not name or not email or not password:
         return jsonify({"error": "Missing fields"}), 400
 
+    conn = get_db()
     try:
-        conn = get_db()
         cur = conn.cursor()
         cur.execute("""
             INSERT INTO users (name, email, phone, password_hash)
             VALUES (?, ?, ?, ?)
-        """, (name, email, phone, generate_password_hash(password)))
+        """, (name, email, phone, hash_password(password)))
         conn.commit()
-        conn.close()
         return jsonify({"message": "User created"}), 201
     except:
+        conn.rollback()
         return jsonify({"error": "Email already exists"}), 409
 
 
@@ -173,9 +290,8 @@ def login():
     cur = conn.cursor()
     cur.execute("SELECT * FROM users WHERE email = ?", (email,))
     user = cur.fetchone()
-    conn.close()
 
-    if not user or not check_password_hash(user["password_hash"], password):
+    if not user or not verify_password(user["password_hash"], password):
         return jsonify({"error": "Invalid credentials"}), 401
 
     return jsonify({
@@ -194,7 +310,7 @@ def login():
 @app.route("/api/safety-score", methods=["POST"])
 def safety_score_point():
     # Return a default score if model isn't loaded (graceful degradation)
-    if safety_model is None or grid_df is None:
+    if SCORE_TABLE is None:
         # Return a neutral score instead of error, so the app can still function
         return jsonify({
             "safety_score": 5.0,
@@ -209,11 +325,9 @@ def safety_score_point():
         return jsonify({"error": "lat & lng required"}), 400
 
     try:
-        # ✅ SAME features as training
-        features = np.array([ get_cell_features(lat, lng) ])
-
-        score = float(safety_model.predict(features)[0])
-        score = round(np.clip(score, 1, 10), 2)
+        # Precomputed from the SAME features as training; NumPy rounding,
+        # as when the score came straight from model.predict()
+        score = float(np.round(get_cell_score(lat, lng), 2))
 
         return jsonify({"safety_score": score})
     except Exception as e:
@@ -227,30 +341,42 @@ def safety_score_point():
 # ======================================================
 # ROUTE PROXY (supports multiple providers with API key support)
 # ======================================================
-def get_route_osrm(start_lng, start_lat, end_lng, end_lat, overview="full", geometries="geojson"):
-    """Get route from OSRM (no API key required, but rate-limited)."""
+# Walking routes repeat a lot (home / hostel / college), so successful
+# responses are cached for an hour, keyed by the endpoints rounded to 4
+# decimals (~11 m).
+ROUTE_CACHE = TTLCache(maxsize=10_000, ttl=3600)
+ROUTE_CACHE_LOCK = threading.Lock()
+
+# Shared session so repeat calls reuse the TCP/TLS connection to a provider
+http_session = requests.Session()
+
+
+# Each provider is described by the HTTP request to make and a function
+# converting its JSON reply to the OSRM-like format the frontend expects.
+# The same descriptions back the sync Flask view below and the async
+# handler in asgi.py.
+def osrm_route_request(start_lng, start_lat, end_lng, end_lat, overview="full", geometries="geojson"):
+    """Route from OSRM (no API key required, but rate-limited)."""
     osrm_url = (
         f"https://router.project-osrm.org/route/v1/foot/"
         f"{start_lng},{start_lat};{end_lng},{end_lat}"
         f"?overview={overview}&geometries={geometries}"
     )
-    response = requests.get(osrm_url, timeout=30, headers={"User-Agent": "SafeWalk-App/1.0"})
-    response.raise_for_status()
-    return response.json()
+    return {"method": "GET", "url": osrm_url, "headers": {"User-Agent": "SafeWalk-App/1.0"}}
 
 
-def get_route_mapbox(start_lng, start_lat, end_lng, end_lat, api_key):
-    """Get route from Mapbox Directions API (requires API key)."""
+def mapbox_route_request(start_lng, start_lat, end_lng, end_lat, api_key):
+    """Route from Mapbox Directions API (requires API key)."""
     # Mapbox uses lng,lat format
     coordinates = f"{start_lng},{start_lat};{end_lng},{end_lat}"
     mapbox_url = (
         f"https://api.mapbox.com/directions/v5/mapbox/walking/{coordinates}"
         f"?geometries=geojson&overview=full&access_token={api_key}"
     )
-    response = requests.get(mapbox_url, timeout=30)
-    response.raise_for_status()
-    data = response.json()
-    
+    return {"method": "GET", "url": mapbox_url}
+
+
+def convert_mapbox_route(data):
     # Convert Mapbox response to OSRM-like format
     if data.get("code") == "Ok" and data.get("routes"):
         route = data["routes"][0]
@@ -265,8 +391,8 @@ def get_route_mapbox(start_lng, start_lat, end_lng, end_lat, api_key):
     return data
 
 
-def get_route_openrouteservice(start_lng, start_lat, end_lng, end_lat, api_key):
-    """Get route from OpenRouteService (requires API key, free tier available)."""
+def ors_route_request(start_lng, start_lat, end_lng, end_lat, api_key):
+    """Route from OpenRouteService (requires API key, free tier available)."""
     ors_url = "https://api.openrouteservice.org/v2/directions/foot-walking"
     headers = {
         "Authorization": api_key,
@@ -276,10 +402,10 @@ def get_route_openrouteservice(start_lng, start_lat, end_lng, end_lat, api_key):
         "coordinates": [[start_lng, start_lat], [end_lng, end_lat]],
         "format": "geojson"
     }
-    response = requests.post(ors_url, json=body, headers=headers, timeout=30)
-    response.raise_for_status()
-    data = response.json()
-    
+    return {"method": "POST", "url": ors_url, "headers": headers, "json": body}
+
+
+def convert_ors_route(data):
     # Convert ORS response to OSRM-like format
     if "features" in data and len(data["features"]) > 0:
         feature = data["features"][0]
@@ -297,6 +423,73 @@ def get_route_openrouteservice(start_lng, start_lat, end_lng, end_lat, api_key):
     return data
 
 
+def route_providers(start_lng, start_lat, end_lng, end_lat, overview, geometries):
+    """[(name, request, convert)] for the providers to try, in order."""
+    providers = []
+    
+    # Check for API keys and add providers
+    mapbox_key = os.environ.get("MAPBOX_API_KEY")
+    ors_key = os.environ.get("ORS_API_KEY")
+    
+    if mapbox_key:
+        providers.append(("Mapbox", mapbox_route_request(start_lng, start_lat, end_lng, end_lat, mapbox_key), convert_mapbox_route))
+    if ors_key:
+        providers.append(("OpenRouteService", ors_route_request(start_lng, start_lat, end_lng, end_lat, ors_key), convert_ors_route))
+    # Always add OSRM as fallback
+    providers.append(("OSRM", osrm_route_request(start_lng, start_lat, end_lng, end_lat, overview, geometries), lambda data: data))
+    return providers
+
+
+def parse_route_args(args):
+    """Validate /api/route query args.
+
+    Returns ``(params, cache_key, error)``; ``error`` is a message for a
+    400 response, or None.
+    """
+    start_lng = args.get("start_lng")
+    start_lat = args.get("start_lat")
+    end_lng = args.get("end_lng")
+    end_lat = args.get("end_lat")
+    overview = args.get("overview", "full")
+    geometries = args.get("geometries", "geojson")
+    
+    if not all([start_lng, start_lat, end_lng, end_lat]):
+        return None, None, "start_lng, start_lat, end_lng, end_lat are required"
+    
+    try:
+        cache_key = (
+            round(float(start_lng), 4), round(float(start_lat), 4),
+            round(float(end_lng), 4), round(float(end_lat), 4),
+            overview, geometries,
+        )
+    except ValueError:
+        return None, None, "start_lng, start_lat, end_lng, end_lat must be numbers"
+    
+    params = (start_lng, start_lat, end_lng, end_lat, overview, geometries)
+    return params, cache_key, None
+
+
+# Try each provider this many extra times after a timeout
+ROUTE_MAX_RETRIES = 2
+ROUTE_TIMEOUT = 30
+
+ALL_ROUTE_PROVIDERS_FAILED = {
+    "error": "All routing services failed. Please check your API keys or try again later.",
+    "type": "all_providers_failed",
+    "tip": "Set MAPBOX_API_KEY or ORS_API_KEY environment variables for better reliability"
+}
+
+
+def log_route_http_error(provider_name, status, e):
+    if status == 401 or status == 403:
+        print(f"{provider_name} authentication failed (check API key), trying next provider...")
+    elif status == 429:
+        print(f"{provider_name} rate limited, trying next provider...")
+    else:
+        # For other HTTP errors, try next provider
+        print(f"{provider_name} HTTP error: {e}, trying next provider...")
+
+
 @app.route("/api/route", methods=["GET"])
 def get_route():
     """Proxy endpoint for routing services to avoid CORS issues.
@@ -305,61 +498,41 @@ def get_route():
     - OSRM (default, no API key needed but rate-limited)
     - Mapbox (requires MAPBOX_API_KEY env var)
     - OpenRouteService (requires ORS_API_KEY env var)
+    
+    Under an ASGI server (see asgi.py) this route is served by an async
+    handler instead.
     """
     try:
-        start_lng = request.args.get("start_lng")
-        start_lat = request.args.get("start_lat")
-        end_lng = request.args.get("end_lng")
-        end_lat = request.args.get("end_lat")
-        overview = request.args.get("overview", "full")
-        geometries = request.args.get("geometries", "geojson")
+        params, cache_key, error = parse_route_args(request.args)
+        if error:
+            return jsonify({"error": error}), 400
         
-        if not all([start_lng, start_lat, end_lng, end_lat]):
-            return jsonify({"error": "start_lng, start_lat, end_lng, end_lat are required"}), 400
-        
-        # Try providers in order of preference
-        providers = []
-        
-        # Check for API keys and add providers
-        mapbox_key = os.environ.get("MAPBOX_API_KEY")
-        ors_key = os.environ.get("ORS_API_KEY")
-        
-        if mapbox_key:
-            providers.append(("Mapbox", lambda: get_route_mapbox(start_lng, start_lat, end_lng, end_lat, mapbox_key)))
-        if ors_key:
-            providers.append(("OpenRouteService", lambda: get_route_openrouteservice(start_lng, start_lat, end_lng, end_lat, ors_key)))
-        # Always add OSRM as fallback
-        providers.append(("OSRM", lambda: get_route_osrm(start_lng, start_lat, end_lng, end_lat, overview, geometries)))
+        with ROUTE_CACHE_LOCK:
+            cached = ROUTE_CACHE.get(cache_key)
+        if cached is not None:
+            return jsonify(cached), 200
         
         # Try each provider with retries
-        max_retries = 2
-        timeout = 30
-        
-        for provider_name, provider_func in providers:
-            for attempt in range(max_retries + 1):
+        for provider_name, provider_request, convert in route_providers(*params):
+            for attempt in range(ROUTE_MAX_RETRIES + 1):
                 try:
                     print(f"Trying {provider_name} (attempt {attempt + 1})...")
-                    result = provider_func()
+                    response = http_session.request(timeout=ROUTE_TIMEOUT, **provider_request)
+                    response.raise_for_status()
+                    result = convert(response.json())
                     print(f"✅ Successfully got route from {provider_name}")
+                    with ROUTE_CACHE_LOCK:
+                        ROUTE_CACHE[cache_key] = result
                     return jsonify(result), 200
                 except requests.exceptions.Timeout:
-                    if attempt < max_retries:
-                        print(f"{provider_name} timeout (attempt {attempt + 1}/{max_retries + 1}), retrying...")
+                    if attempt < ROUTE_MAX_RETRIES:
+                        print(f"{provider_name} timeout (attempt {attempt + 1}/{ROUTE_MAX_RETRIES + 1}), retrying...")
                         continue
                     else:
-                        print(f"{provider_name} failed after {max_retries + 1} attempts, trying next provider...")
+                        print(f"{provider_name} failed after {ROUTE_MAX_RETRIES + 1} attempts, trying next provider...")
                         break
                 except requests.exceptions.HTTPError as e:
-                    if e.response:
-                        status = e.response.status_code
-                        if status == 401 or status == 403:
-                            print(f"{provider_name} authentication failed (check API key), trying next provider...")
-                            break
-                        elif status == 429:
-                            print(f"{provider_name} rate limited, trying next provider...")
-                            break
-                    # For other HTTP errors, try next provider
-                    print(f"{provider_name} HTTP error: {e}, trying next provider...")
+                    log_route_http_error(provider_name, e.response.status_code if e.response is not None else None, e)
                     break
                 except requests.exceptions.ConnectionError:
                     print(f"{provider_name} connection error, trying next provider...")
@@ -369,11 +542,7 @@ def get_route():
                     break
         
         # If all providers failed
-        return jsonify({
-            "error": "All routing services failed. Please check your API keys or try again later.",
-            "type": "all_providers_failed",
-            "tip": "Set MAPBOX_API_KEY or ORS_API_KEY environment variables for better reliability"
-        }), 503
+        return jsonify(ALL_ROUTE_PROVIDERS_FAILED), 503
         
     except Exception as e:
         print(f"Route proxy error: {e}")
@@ -400,15 +569,15 @@ def score_route():
         return jsonify({"error": "coords must be a non-empty array"}), 400
 
     # If model isn't loaded, return a default score (graceful degradation)
-    if safety_model is None or grid_df is None:
+    if SCORE_TABLE is None:
         print("⚠️ Safety model not loaded - returning default score")
         # Return a neutral default score so the app can still function
         default_score = 5.0
-        return jsonify({
+        return orjson_response({
             "score": default_score,
             "segments": [default_score] * min(100, len(coords)),
             "warning": "Safety model not loaded - using default score. Retrain model on Python 3.13 to enable ML-based scoring."
-        }), 200
+        }, 200)
 
     try:
         # Sample coordinates if route is very long (to avoid processing too many points)
@@ -416,19 +585,20 @@ def score_route():
             step = len(coords) // 1000
             coords = coords[::step]
         
-        X = np.array([get_cell_features(p[0], p[1]) for p in coords])
+        pts = np.asarray(coords, dtype=np.float64)[:, :2]
         
-        if X.shape[0] == 0:
+        if pts.shape[0] == 0:
             return jsonify({"error": "No valid coordinates to score"}), 400
         
-        preds = safety_model.predict(X)
-        
-        # Clip scores to valid range (1-10) and calculate mean
-        preds_clipped = np.clip(preds, 1, 10)
-        avg_score = float(np.mean(preds_clipped))
+        # Per-cell score table lookup (nearest cell for points off the
+        # grid) + mean; scores are already clipped to the valid range (1-10)
+        preds_clipped, avg_score = score_route_points(
+            pts, GRID_KEYS, SCORE_TABLE, MISS_SCORE, GRID_STEP, tree=GRID_TREE
+        )
         
-        return jsonify({
+        return orjson_response({
             "score": round(avg_score, 2),
+            # Python's round(), as before: np.round breaks .xx5 ties differently
             "segments": [round(float(x), 2) for x in preds_clipped[:100]]  # Limit segments for response size
         })
     except Exception as e:
@@ -436,11 +606,11 @@ def score_route():
         import traceback
         traceback.print_exc()
         # Return default score on error instead of failing
-        return jsonify({
+        return orjson_response({
             "score": 5.0,
             "segments": [5.0] * min(100, len(coords)),
             "warning": f"Error calculating score: {str(e)}"
-        }), 200
+        }, 200)
 
 
 # ======================================================
@@ -448,6 +618,7 @@ def score_route():
 # ======================================================
 @app.route("/api/sos", methods=["POST"])
 def sos():
+    conn = get_db()
     try:
         d = request.json or {}
         
@@ -466,7 +637,6 @@ def sos():
         user_id = d.get("user_id")
         message = d.get("message", "HELP ME")
         
-        conn = get_db()
         cur = conn.cursor()
         cur.execute("""
             INSERT INTO sos_alerts (user_id, lat, lng, message, timestamp)
@@ -475,7 +645,6 @@ def sos():
             user_id, lat, lng, message, timestamp
         ))
         conn.commit()
-        conn.close()
         
         return jsonify({
             "message": "🚨 SOS alert sent successfully",
@@ -483,6 +652,7 @@ def sos():
         }), 201
         
     except Exception as e:
+        conn.rollback()
         print(f"Error processing SOS alert: {e}")
         import traceback
         traceback.print_exc()
@@ -495,7 +665,7 @@ def sos():
 @app.route("/api/reload-ml", methods=["POST"])
 def reload_ml():
     load_ml()
-    if safety_model is None or grid_df is None:
+    if SCORE_TABLE is None:
         return jsonify({
             "error": "Failed to reload ML model",
             "tip": "If you see KeyError, the model was trained on a different Python version. Retrain with: python train_safety_model.py"
@@ -562,6 +732,8 @@ def train_model_endpoint():
 # RUN
 # ======================================================
 if __name__ == "__main__":
+    # Development server only; in production run under gunicorn instead:
+    #   gunicorn -c gunicorn.conf.py wsgi:app
     # When running on platforms like Render, the port is provided via the
     # PORT environment variable. Locally, we fall back to 5001.
     port = int(os.environ.get("PORT", 5001))
@@ -0,0 +1,116 @@
+# ASGI entry point, e.g.:
+#   uvicorn asgi:application --host 0.0.0.0 --port $PORT --workers 2
+#
+# GET /api/route is pure I/O (it waits on OSRM / Mapbox / ORS), so here
+# it's served by an async handler sharing one pooled HTTP/2 client: a
+# single worker can keep hundreds of provider lookups in flight instead
+# of blocking a thread on each. Every other request goes to the Flask app
+# on a pool of WSGI_THREADS threads (default 8, like GUNICORN_THREADS).
+import json
+import os
+from urllib.parse import parse_qs
+
+import httpx
+from a2wsgi import WSGIMiddleware
+
+from app import (
+    ALL_ROUTE_PROVIDERS_FAILED,
+    CORS_ORIGINS,
+    ROUTE_CACHE,
+    ROUTE_CACHE_LOCK,
+    ROUTE_MAX_RETRIES,
+    ROUTE_TIMEOUT,
+    app,
+    log_route_http_error,
+    parse_route_args,
+    route_providers,
+)
+
+WSGI_THREADS = int(os.environ.get("WSGI_THREADS", 8))
+# a2wsgi runs Flask on a pool of WSGI_THREADS threads, so one slow
+# request (e.g. a password hash) doesn't stall the others
+flask_app = WSGIMiddleware(app, workers=WSGI_THREADS)
+
+http_client = httpx.AsyncClient(http2=True, timeout=ROUTE_TIMEOUT)
+
+
+async def send_json(send, scope, payload, status):
+    headers = [(b"content-type", b"application/json")]
+
+    # Same policy as the flask-cors setup in app.py
+    origin = dict(scope["headers"]).get(b"origin", b"").decode("latin-1")
+    if not CORS_ORIGINS:
+        headers.append((b"access-control-allow-origin", b"*"))
+    elif origin in CORS_ORIGINS:
+        headers.append((b"access-control-allow-origin", origin.encode("latin-1")))
+        headers.append((b"vary", b"Origin"))
+
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": json.dumps(payload).encode()})
+
+
+async def get_route(scope, send):
+    """Async twin of app.get_route()."""
+    try:
+        query = parse_qs(scope["query_string"].decode("latin-1"))
+        args = {k: v[0] for k, v in query.items()}
+
+        params, cache_key, error = parse_route_args(args)
+        if error:
+            return await send_json(send, scope, {"error": error}, 400)
+
+        with ROUTE_CACHE_LOCK:
+            cached = ROUTE_CACHE.get(cache_key)
+        if cached is not None:
+            return await send_json(send, scope, cached, 200)
+
+        # Try each provider with retries
+        for provider_name, provider_request, convert in route_providers(*params):
+            for attempt in range(ROUTE_MAX_RETRIES + 1):
+                try:
+                    print(f"Trying {provider_name} (attempt {attempt + 1})...")
+                    response = await http_client.request(**provider_request)
+                    response.raise_for_status()
+                    result = convert(response.json())
+                    print(f"✅ Successfully got route from {provider_name}")
+                    with ROUTE_CACHE_LOCK:
+                        ROUTE_CACHE[cache_key] = result
+                    return await send_json(send, scope, result, 200)
+                except httpx.TimeoutException:
+                    if attempt < ROUTE_MAX_RETRIES:
+                        print(f"{provider_name} timeout (attempt {attempt + 1}/{ROUTE_MAX_RETRIES + 1}), retrying...")
+                        continue
+                    else:
+                        print(f"{provider_name} failed after {ROUTE_MAX_RETRIES + 1} attempts, trying next provider...")
+                        break
+                except httpx.HTTPStatusError as e:
+                    log_route_http_error(provider_name, e.response.status_code, e)
+                    break
+                except httpx.TransportError:
+                    print(f"{provider_name} connection error, trying next provider...")
+                    break
+                except Exception as e:
+                    print(f"{provider_name} error: {e}, trying next provider...")
+                    break
+
+        # If all providers failed
+        return await send_json(send, scope, ALL_ROUTE_PROVIDERS_FAILED, 503)
+
+    except Exception as e:
+        print(f"Route proxy error: {e}")
+        import traceback
+        traceback.print_exc()
+        return await send_json(send, scope, {
+            "error": f"Internal server error: {str(e)}",
+            "type": "server_error"
+        }, 500)
+
+
+async def application(scope, receive, send):
+    if (
+        scope["type"] == "http"
+        and scope["method"] == "GET"
+        and scope["path"].rstrip("/") == "/api/route"
+    ):
+        return await get_route(scope, send)
+    return await flask_app(scope, receive, send)
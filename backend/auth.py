@@ -1,7 +1,30 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 from werkzeug.security import generate_password_hash, check_password_hash
 
+# Pinned explicitly so a werkzeug upgrade can't silently change the cost
+# of every login. Existing hashes keep verifying with the method they were
+# created with; only new hashes use this one.
+PASSWORD_HASH_METHOD = os.environ.get("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+
+# hashlib releases the GIL while hashing, so hashes run on a dedicated
+# pool sized to half the cores by default: a login burst can then use at
+# most PASSWORD_HASH_THREADS cores per worker process, leaving the rest
+# for the ML endpoints.
+PASSWORD_HASH_THREADS = int(
+    os.environ.get("PASSWORD_HASH_THREADS", max(1, (os.cpu_count() or 1) // 2))
+)
+HASH_POOL = ThreadPoolExecutor(
+    max_workers=PASSWORD_HASH_THREADS, thread_name_prefix="password-hash"
+)
+
+
 def hash_password(password):
-    return generate_password_hash(password)
+    return HASH_POOL.submit(
+        generate_password_hash, password, method=PASSWORD_HASH_METHOD
+    ).result()
+
 
 def verify_password(hash, password):
-    return check_password_hash(hash, password)
\ No newline at end of file
+    return HASH_POOL.submit(check_password_hash, hash, password).result()
@@ -0,0 +1,28 @@
+"""One-off conversion of the Excel datasets to Parquet.
+
+openpyxl parses .xlsx in pure Python; pyarrow reads Parquet in C, so
+generate_grid_features.py runs much faster once this has been run.
+Re-run it whenever incident.xlsx or police.xlsx change.
+
+    python convert_data.py
+"""
+import os
+
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BASE_DIR, "data")
+
+DATASETS = ["incident", "police"]
+
+
+def convert_data():
+    for name in DATASETS:
+        xlsx_path = os.path.join(DATA_DIR, f"{name}.xlsx")
+        parquet_path = os.path.join(DATA_DIR, f"{name}.parquet")
+        pd.read_excel(xlsx_path).to_parquet(parquet_path, index=False)
+        print(f"✅ {xlsx_path} -> {parquet_path}")
+
+
+if __name__ == "__main__":
+    convert_data()
@@ -1,17 +1,36 @@
 import sqlite3
 import os
+import threading
 
 DB_NAME = os.path.join(os.path.dirname(__file__), "database.db")
 
+# One connection per thread, opened on first use and reused after that
+_local = threading.local()
 
-def get_db():
-    conn = sqlite3.connect(DB_NAME)
+
+def _connect():
+    conn = sqlite3.connect(DB_NAME, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    # WAL + NORMAL sync: commits append to the log instead of fsyncing a
+    # rollback journal, and readers don't block the writer.
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+
+def get_db():
+    """Return this thread's connection. It stays open, so don't close it."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _local.conn = _connect()
     return conn
 
 
 def init_db():
-    conn = get_db()
+    # Own short-lived connection, so nothing opened here gets inherited by
+    # forked server workers.
+    conn = _connect()
     cur = conn.cursor()
 
     # ========= USERS =========
@@ -81,5 +100,9 @@ def init_db():
     # If you have an existing database with user_id NOT NULL constraint,
     # you may need to manually update it or delete database.db to recreate
 
+    # ========= INDEXES =========
+    # users.email is already indexed by its UNIQUE constraint
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_sos_ts ON sos_alerts(timestamp)")
+
     conn.commit()
     conn.close()
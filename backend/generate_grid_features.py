@@ -2,20 +2,55 @@ import pandas as pd
 import numpy as np
 import os
 
+from route_scoring import pack_cell_keys
+
 # Same GRID_STEP as in app.py
 GRID_STEP = 0.0015
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "data")
 GRID_PATH = os.path.join(DATA_DIR, "grid_features.csv")
+# Binary copy of the grid that app.py memory-maps at startup:
+# sorted packed int64 cell keys, the aligned (N, 3) features
+# [incident_count, camera_count, police_count] (uint16 when that's
+# lossless, else float32).
+CELL_KEYS_PATH = os.path.join(DATA_DIR, "cell_keys.npy")
+FEATS_PATH = os.path.join(DATA_DIR, "feats.npy")
 
 
 def make_cell(lat, lng):
-    """Round to grid cell coordinates."""
+    """Round to grid cell coordinates; works on whole arrays at once."""
     return (
-        round(lat / GRID_STEP) * GRID_STEP,
-        round(lng / GRID_STEP) * GRID_STEP,
+        np.round(np.asarray(lat, dtype=np.float64) / GRID_STEP) * GRID_STEP,
+        np.round(np.asarray(lng, dtype=np.float64) / GRID_STEP) * GRID_STEP,
+    )
+
+
+def compact_features(feats):
+    """Store (N, k) features as uint16 if that's lossless, else float32.
+
+    The camera and police counts are integers and fit in uint16 exactly.
+    The incident column is an average (e.g. 3.6363...); rounding it moves
+    some scores across a 0.005 boundary and changes the rounded API
+    output, so while it is fractional the rows stay float32.
+    """
+    integral = np.all(feats == np.round(feats)) and (
+        len(feats) == 0 or (feats.min() >= 0 and feats.max() <= np.iinfo(np.uint16).max)
     )
+    if integral:
+        return feats.astype(np.uint16)
+    return feats.astype(np.float32)
+
+
+def read_dataset(name):
+    """Load data/<name>.parquet if it is at least as new as the .xlsx, else the .xlsx."""
+    parquet_path = os.path.join(DATA_DIR, f"{name}.parquet")
+    xlsx_path = os.path.join(DATA_DIR, f"{name}.xlsx")
+    if os.path.exists(parquet_path):
+        if not os.path.exists(xlsx_path) or os.path.getmtime(parquet_path) >= os.path.getmtime(xlsx_path):
+            return pd.read_parquet(parquet_path)
+        print(f"⚠️ {name}.xlsx is newer than {name}.parquet, reading the xlsx (re-run convert_data.py)")
+    return pd.read_excel(xlsx_path)
 
 
 def generate_grid_features():
@@ -23,8 +58,8 @@ def generate_grid_features():
     
     # Load data files
     try:
-        incident = pd.read_excel(os.path.join(DATA_DIR, "incident.xlsx"))
-        police = pd.read_excel(os.path.join(DATA_DIR, "police.xlsx"))
+        incident = read_dataset("incident")
+        police = read_dataset("police")
         surv = pd.read_csv(os.path.join(DATA_DIR, "surveillance.csv"))
     except Exception as e:
         print(f"❌ Error loading data files: {e}")
@@ -38,8 +73,7 @@ def generate_grid_features():
     print("🔨 Building grid features from location-specific data...")
     
     # Create grid cells from surveillance data (has GPS coordinates)
-    surv["cell_lat"] = surv["lat"].apply(lambda x: make_cell(x, 0)[0])
-    surv["cell_lon"] = surv["lon"].apply(lambda x: make_cell(0, x)[1])
+    surv["cell_lat"], surv["cell_lon"] = make_cell(surv["lat"].to_numpy(), surv["lon"].to_numpy())
     
     # Aggregate features per grid cell using ACTUAL location-specific data from surveillance.csv
     # This gives us varied features per location instead of area-level averages
@@ -95,6 +129,18 @@ def generate_grid_features():
     # Save to CSV
     grid_df.to_csv(GRID_PATH, index=False)
     print(f"✅ Grid features saved to {GRID_PATH}")
+
+    # Save the sorted binary feature store used by app.py
+    keys = pack_cell_keys(grid_df["cell_lat"].values, grid_df["cell_lon"].values, GRID_STEP)
+    order = np.argsort(keys)
+    feats = np.stack([
+        grid_df["incident_count"].values,
+        grid_df["camera_count"].values,
+        grid_df["police_count"].values,
+    ], axis=1).astype(np.float64)
+    np.save(CELL_KEYS_PATH, keys[order].astype(np.int64))
+    np.save(FEATS_PATH, np.ascontiguousarray(compact_features(feats[order])))
+    print(f"✅ Feature store saved to {CELL_KEYS_PATH} and {FEATS_PATH}")
     print(f"   Total grid cells: {len(grid_df)}")
     print(f"   Columns: {list(grid_df.columns)}")
 
@@ -0,0 +1,22 @@
+# Gunicorn settings for production: gunicorn -c gunicorn.conf.py wsgi:app
+#
+# The app is preloaded once in the master and forked into the workers.
+# The grid feature store (data/*.npy) is memory-mapped read-only, so all
+# workers share the same pages from the kernel page cache -- adding
+# workers doesn't multiply the RAM used by the grid.
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5001')}"
+worker_class = "gthread"
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+threads = int(os.environ.get("GUNICORN_THREADS", 8))
+preload_app = True
+
+
+def post_fork(server, worker):
+    # Reload in each worker so one respawned after /api/train-model picks
+    # up the current model and grid instead of the master's stale copy.
+    import app
+
+    app.load_ml()
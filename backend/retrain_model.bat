@@ -35,7 +35,7 @@ echo Training complete!
 echo ========================================
 echo.
 echo Next steps:
-echo 1. Commit the new safety_model.pkl file
+echo 1. Commit the new safety_model.json and safety_model.pkl files
 echo 2. Push to GitHub
 echo 3. Render will auto-deploy with the new model
 echo.
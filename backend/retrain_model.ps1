@@ -48,7 +48,7 @@ if ($pythonFound) {
     Write-Host "========================================" -ForegroundColor Green
     Write-Host ""
     Write-Host "Next steps:" -ForegroundColor Cyan
-    Write-Host "1. Commit the new safety_model.pkl file"
+    Write-Host "1. Commit the new safety_model.json and safety_model.pkl files"
     Write-Host "2. Push to GitHub"
     Write-Host "3. Render will auto-deploy with the new model"
     Write-Host ""
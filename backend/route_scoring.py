@@ -0,0 +1,188 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:  # numba is optional; fall back to the NumPy path
+    numba = None
+
+
+def pack_cell_keys(lats, lngs, grid_step):
+    """Pack arrays of lat/lng into one int64 key per grid cell.
+
+    The integer cell ids are the same ``round(x / grid_step)`` that
+    make_cell() uses, so a point and its cell centre map to the same key.
+    """
+    lat_i = np.round(np.asarray(lats, dtype=np.float64) / grid_step).astype(np.int64)
+    lng_i = np.round(np.asarray(lngs, dtype=np.float64) / grid_step).astype(np.int64)
+    return (lat_i << 32) | (lng_i & 0xFFFFFFFF)
+
+
+def unpack_cell_keys(keys, grid_step):
+    """Inverse of pack_cell_keys: (n, 2) array of cell-centre lat/lng."""
+    keys = np.asarray(keys, dtype=np.int64)
+    lat_i = keys >> 32
+    lng_i = (keys & 0xFFFFFFFF).astype(np.uint32).astype(np.int32)
+    return np.stack([lat_i * grid_step, lng_i * grid_step], axis=1)
+
+
+def nearest_cells(tree, pts, grid_step):
+    """Row of the closest grid cell for points whose own cell has no data.
+
+    Searches around the centre of each point's cell (so every point in a
+    cell gets the same answer) within ``2 * grid_step``; -1 if none.
+    """
+    centres = np.rint(np.asarray(pts, dtype=np.float64) / grid_step) * grid_step
+    _, idx = tree.query(centres, k=1, distance_upper_bound=2 * grid_step)
+    return np.where(idx < tree.n, idx, -1)
+
+
+# Routes at least this long are split across cores; for shorter ones
+# waking the worker threads costs more than it saves.
+PARALLEL_MIN_POINTS = 1000
+
+_NUM_THREADS = os.cpu_count() or 1
+_numpy_pool = ThreadPoolExecutor(
+    max_workers=_NUM_THREADS, thread_name_prefix="route-scoring"
+)
+
+
+def _lookup_cells_numpy(pts, keys, grid_step):
+    k = pack_cell_keys(pts[:, 0], pts[:, 1], grid_step)
+    if len(keys) == 0:
+        return np.full(len(k), -1, dtype=np.int64)
+    pos = np.searchsorted(keys, k).clip(max=len(keys) - 1)
+    return np.where(keys[pos] == k, pos, -1)
+
+
+def _lookup_route_numpy(pts, keys, grid_step):
+    if len(pts) < PARALLEL_MIN_POINTS:
+        return _lookup_cells_numpy(pts, keys, grid_step)
+    # searchsorted and the gathers release the GIL, so chunks of the
+    # route really do run in parallel on the pool.
+    chunks = np.array_split(pts, _NUM_THREADS)
+    return np.concatenate(list(_numpy_pool.map(
+        lambda chunk: _lookup_cells_numpy(chunk, keys, grid_step), chunks
+    )))
+
+
+def _lookup_point(lat, lng, keys, grid_step):
+    # Cell id -> binary search in the sorted keys
+    lat_i = np.int64(np.rint(lat / grid_step))
+    lng_i = np.int64(np.rint(lng / grid_step))
+    key = (lat_i << 32) | (lng_i & 0xFFFFFFFF)
+
+    m = keys.shape[0]
+    lo = 0
+    hi = m
+    while lo < hi:
+        mid = (lo + hi) >> 1
+        if keys[mid] < key:
+            lo = mid + 1
+        else:
+            hi = mid
+
+    if lo < m and keys[lo] == key:
+        return lo
+    return -1
+
+
+def _lookup_route_kernel(coords, keys, grid_step, out):
+    for i in range(coords.shape[0]):
+        out[i] = _lookup_point(coords[i, 0], coords[i, 1], keys, grid_step)
+
+
+def _lookup_route_kernel_parallel(coords, keys, grid_step, out):
+    # Same as _lookup_route_kernel, with the points spread over cores
+    for i in numba.prange(coords.shape[0]):
+        out[i] = _lookup_point(coords[i, 0], coords[i, 1], keys, grid_step)
+
+
+if numba is not None:
+    # No fastmath: it turns x / grid_step into x * (1 / grid_step), which
+    # rounds points exactly on a half-cell boundary into a different cell
+    # than pack_cell_keys() / app.make_cell() pick.
+    _lookup_point = numba.njit(cache=True)(_lookup_point)
+    _lookup_route_kernel = numba.njit(cache=True)(_lookup_route_kernel)
+    # Not warmed up at import: compiling starts Numba's thread pool, which
+    # must not happen in a gunicorn master that later forks. cache=True
+    # keeps the first long route of a worker from paying a full compile.
+    _lookup_route_kernel_parallel = numba.njit(
+        cache=True, parallel=True
+    )(_lookup_route_kernel_parallel)
+    # The kernel is called from request threads (gunicorn gthread, the
+    # asgi.py pool). With the TBB layer, which Numba picks when tbb is
+    # installed, that hangs the process at exit, so pin the built-in
+    # workqueue layer before anything parallel runs.
+    numba.config.THREADING_LAYER = "workqueue"
+    # workqueue isn't safe for concurrent use, and one call already
+    # occupies every core, so parallel calls are serialized.
+    _parallel_lock = threading.Lock()
+
+
+
+def _lookup_parity_ok(grid_step=0.0015):
+    """Whether the Numba kernel puts half-cell boundary points in the same
+    cells as pack_cell_keys() + searchsorted.
+
+    5-decimal coordinates (OSRM precision) ending in ...25 / ...75 sit
+    exactly on a boundary, where any change in how x / grid_step is
+    rounded shows up as a different cell.
+    """
+    k = np.arange(-2000, 2000) + 0.5
+    pts = np.round(np.stack([12.9 + k * grid_step, 77.5 + k * grid_step], axis=1), 5)
+    # Every point's own cell is present, so landing in a neighbouring cell
+    # gives a different row (or -1) rather than an unnoticed miss
+    keys = np.unique(pack_cell_keys(pts[:, 0], pts[:, 1], grid_step))
+    # Read-only int64 keys, like the mmap'd ones app.load_ml() passes, so
+    # this doubles as the warm-up compile and no recompile happens later
+    keys.setflags(write=False)
+    pos = np.empty(len(pts), dtype=np.int64)
+    _lookup_route_kernel(pts, keys, grid_step, pos)
+    return np.array_equal(pos, _lookup_cells_numpy(pts, keys, grid_step))
+
+
+if numba is not None and not _lookup_parity_ok():
+    print("⚠️ Numba cell lookup disagrees with pack_cell_keys(), using NumPy")
+    numba = None
+
+
+def lookup_route_cells(pts, keys, grid_step):
+    """Grid row of each point of an (n, 2) lat/lng array, -1 if unknown.
+
+    Routes of at least PARALLEL_MIN_POINTS points are looked up on all cores.
+    """
+    if numba is None:
+        return _lookup_route_numpy(pts, keys, grid_step)
+
+    pts = np.ascontiguousarray(pts, dtype=np.float64)
+    pos = np.empty(len(pts), dtype=np.int64)
+    if len(pts) < PARALLEL_MIN_POINTS:
+        _lookup_route_kernel(pts, keys, float(grid_step), pos)
+    else:
+        with _parallel_lock:
+            _lookup_route_kernel_parallel(pts, keys, float(grid_step), pos)
+    return pos
+
+
+def score_route_points(pts, keys, table, miss_score, grid_step, tree=None):
+    """Safety score per point and their mean.
+
+    ``pts`` is an (n, 2) lat/lng array, ``keys`` the sorted grid keys and
+    ``table`` the precomputed score of each grid cell. Points whose cell
+    has no data take the nearest cell's score when a KD-tree over the
+    cell centres is given, else ``miss_score``.
+    """
+    pos = lookup_route_cells(pts, keys, grid_step)
+
+    miss = pos < 0
+    if tree is not None and miss.any():
+        pos[miss] = nearest_cells(tree, pts[miss], grid_step)
+
+    scores = np.full(len(pts), miss_score, dtype=np.float64)
+    hit = pos >= 0
+    scores[hit] = table[pos[hit]]
+    return scores, float(scores.mean())
@@ -1,21 +1,218 @@
-import pandas as pd
 import numpy as np
-from sklearn.linear_model import LinearRegression
-import joblib
+import json
 import os
+import pickle
 import sys
+import warnings
 
-# Fix encoding for Windows console
-if sys.platform == 'win32':
-    import codecs
-    sys.stdout = codecs.getwriter('utf-8')(sys.stdout.buffer, 'strict')
-    sys.stderr = codecs.getwriter('utf-8')(sys.stderr.buffer, 'strict')
+try:
+    import numba
+except ImportError:  # numba is optional; fall back to numexpr / NumPy
+    numba = None
+
+try:
+    import numexpr
+except ImportError:  # numexpr is optional; fall back to plain NumPy
+    numexpr = None
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 GRID_PATH = os.path.join(BASE_DIR, "data", "grid_features.csv")
+MODEL_PATH = os.path.join(BASE_DIR, "safety_model.pkl")
+# Just the coefficients, which is all app.py needs to serve the model
+MODEL_JSON_PATH = os.path.join(BASE_DIR, "safety_model.json")
+
+# Read buffer for the CSV: fewer read() calls on large grids
+READ_BUFFER = 1 << 20
+
+# Same feature order as app.py: [incident_count, camera_count, police_count]
+FEATURE_COLUMNS = ["incident_count", "camera_count", "police_count"]
+
+# The labels are an exact linear function of the features, so unless
+# clipping kicks in the least-squares fit just recovers the formula's
+# weights. Set SAFETY_MODEL_CLOSED_FORM=0 to always run the fit.
+CLOSED_FORM = os.environ.get("SAFETY_MODEL_CLOSED_FORM", "1") != "0"
+
+# Rows parsed at a time, so memory use doesn't grow with the grid
+CHUNK_ROWS = 200_000
+
+# Training statistics are cached on disk between runs (joblib.Memory)
+CACHE_DIR = os.path.join(BASE_DIR, ".cache")
+
+
+def read_feature_chunks(path, chunk_rows=CHUNK_ROWS):
+    """Yield the feature columns of a grid CSV as (n, 3) float32 blocks.
+
+    The parsed columns are also written to a raw float32 file next to the
+    CSV, after a stamp of the CSV's size and mtime (ns). Later runs
+    memory-map that file instead of parsing the CSV again, but only while
+    the stamp matches the CSV exactly: an older CSV restored with its
+    original mtime (cp -p, tar, rsync -a) doesn't count as cached.
+    """
+    cache_path = os.path.splitext(path)[0] + ".f32"
+    stat = os.stat(path)
+    stamp = np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+    if os.path.exists(cache_path) and np.array_equal(
+        np.fromfile(cache_path, dtype=np.int64, count=len(stamp)), stamp
+    ):
+        # Copy-on-write mapping: blocks are writable views, as the labels
+        # kernel wants, without copying them out of the page cache
+        X = np.memmap(
+            cache_path, dtype=np.float32, mode="c", offset=stamp.nbytes
+        ).reshape(-1, len(FEATURE_COLUMNS))
+        for start in range(0, len(X), chunk_rows):
+            yield X[start:start + chunk_rows]
+        return
+
+    # Only the three feature columns are needed, so parse them straight
+    # into an array instead of building a DataFrame of the whole file
+    tmp_path = cache_path + ".tmp"
+    with open(path, buffering=READ_BUFFER) as f, open(tmp_path, "wb") as cache:
+        stamp.tofile(cache)
+        header = f.readline().strip().split(",")
+        usecols = [header.index(name) for name in FEATURE_COLUMNS]
+        while True:
+            # loadtxt picks up right where the header (or the previous
+            # block) left off and stops after max_rows lines
+            with warnings.catch_warnings():
+                # An exhausted file just gives an empty block
+                warnings.simplefilter("ignore", UserWarning)
+                # float32 throughout: the counts are small and exactly
+                # representable, and it halves the memory traffic of every pass
+                X = np.loadtxt(
+                    f, delimiter=",", usecols=usecols, ndmin=2,
+                    dtype=np.float32, max_rows=chunk_rows,
+                )
+            if len(X) == 0:
+                break
+            X.tofile(cache)
+            yield X
+            if len(X) < chunk_rows:
+                break
+    os.replace(tmp_path, cache_path)
+
+
+def _labels_kernel(X, weights, base_score, out):
+    for i in numba.prange(X.shape[0]):
+        out[i] = base_score + weights[0] * X[i, 0] + weights[1] * X[i, 1] + weights[2] * X[i, 2]
+
+
+def _clip_labels_kernel(y):
+    lo = y[0]
+    hi = y[0]
+    total = 0.0
+    for i in range(y.shape[0]):
+        v = y[i]
+        lo = min(lo, v)
+        hi = max(hi, v)
+        v = min(max(v, 1.0), 10.0)
+        y[i] = v
+        total += v
+    return lo, hi, total
+
+
+if numba is not None:
+    # Explicit signature: compiled once here rather than on first call
+    _labels_kernel = numba.njit(
+        "void(float32[:, ::1], float32[::1], float32, float32[::1])",
+        parallel=True, fastmath=True, cache=True,
+    )(_labels_kernel)
+    _clip_labels_kernel = numba.njit(cache=True)(_clip_labels_kernel)
+
+
+def compute_labels(X, weights, base_score):
+    """Unclipped safety-score labels of a feature block."""
+    weights = weights.astype(np.float32)
+    if numba is not None:
+        # One fused loop over the rows, spread across cores
+        y = np.empty(len(X), dtype=np.float32)
+        _labels_kernel(X, weights, np.float32(base_score), y)
+        return y
+    if numexpr is not None:
+        # Whole formula in one fused, multithreaded pass over the columns
+        return numexpr.evaluate(
+            "b + w0 * x0 + w1 * x1 + w2 * x2",
+            local_dict={
+                "b": np.float32(base_score),
+                "w0": weights[0], "w1": weights[1], "w2": weights[2],
+                "x0": X[:, 0], "x1": X[:, 1], "x2": X[:, 2],
+            },
+        )
+    # One matrix-vector product instead of a temporary per column
+    y = X @ weights
+    y += np.float32(base_score)
+    return y
+
+
+def clip_labels(y):
+    """Clip labels to [1, 10] in place.
+
+    Returns the unclipped min and max and the clipped sum, gathered in the
+    same pass over the labels when Numba is available.
+    """
+    if numba is not None:
+        lo, hi, total = _clip_labels_kernel(y)
+        return float(lo), float(hi), total
+    lo, hi = float(y.min()), float(y.max())
+    # Plain max/min ufuncs: straight SIMD loops, no mask like np.clip
+    np.maximum(y, np.float32(1), out=y)
+    np.minimum(y, np.float32(10), out=y)
+    return lo, hi, float(y.sum(dtype=np.float64))
+
+
+def accumulate_normal_equations(A, b, X, y):
+    """Add a block's share of [X 1].T @ [X 1] and [X 1].T @ y to A and b.
+
+    Built from its blocks, so X is never copied into an augmented matrix,
+    and accumulated in float64 even for float32 inputs.
+    """
+    p = X.shape[1]
+    A[:p, :p] += np.einsum("ij,ik->jk", X, X, dtype=np.float64)
+    col_sums = X.sum(axis=0, dtype=np.float64)
+    A[:p, p] += col_sums
+    A[p, :p] += col_sums
+    A[p, p] += X.shape[0]
+    b[:p] += np.einsum("ij,i->j", X, y, dtype=np.float64)
+    b[p] += y.sum(dtype=np.float64)
+
+
+def summarize_training_data(path, mtime_ns, size, weights, base_score):
+    """Normal equations and label statistics of a grid CSV.
+
+    The file is streamed in CHUNK_ROWS blocks and only the 4x4 system and
+    a few running totals are kept, so any size of grid fits in memory.
+    ``mtime_ns`` and ``size`` aren't used here, they're part of the cache key
+    so an edited grid_features.csv is read again.
+    """
+    p = len(FEATURE_COLUMNS)
+    A = np.zeros((p + 1, p + 1))
+    b = np.zeros(p + 1)
+    n = 0
+    y_min, y_max, y_sum = np.inf, -np.inf, 0.0
+    for X in read_feature_chunks(path):
+        y = compute_labels(X, weights, base_score)
+        lo, hi, total = clip_labels(y)
+        y_min, y_max, y_sum = min(y_min, lo), max(y_max, hi), y_sum + total
+        accumulate_normal_equations(A, b, X, y)
+        n += len(X)
+
+    return {
+        "A": A,
+        "b": b,
+        "n": n,
+        # float32 rounding can leave a label that sits exactly on a bound
+        # a hair outside it; that isn't clipping worth refitting for
+        "clipped": y_min < 1 - 1e-4 or y_max > 10 + 1e-4,
+        "y_min": min(max(y_min, 1), 10),
+        "y_max": min(max(y_max, 1), 10),
+        "y_mean": y_sum / n,
+    }
 
 
 def train_model():
+    # Imported here so importing this module stays cheap
+    from joblib import Memory
+    from sklearn.linear_model import LinearRegression
+    
     print("Loading grid features...")
     
     # Use the location-specific features from grid_features.csv
@@ -23,13 +220,6 @@ def train_model():
         print("ERROR: grid_features.csv not found. Run generate_grid_features.py first.")
         return
     
-    df = pd.read_csv(GRID_PATH)
-    print(f"SUCCESS: Loaded {len(df)} grid cells with location-specific features")
-    
-    # Use the same feature names as in app.py: incident_count, camera_count, police_count
-    # Map to the format expected: [incident_count, camera_count, police_count]
-    X = df[["incident_count", "camera_count", "police_count"]].values
-    
     # Calculate safety score using a formula that gives varied scores
     # Higher cameras and police = safer, higher incidents = less safe
     # Formula: base_score - incidents*penalty + cameras*bonus + police*bonus
@@ -38,29 +228,53 @@ def train_model():
     camera_bonus = 0.3  # Each camera increases safety
     police_bonus = 1.5  # Police presence significantly increases safety
     
-    y = np.clip(
-        base_score
-        - X[:, 0] * incident_penalty  # incident_count (crime)
-        + X[:, 1] * camera_bonus      # camera_count (surveillance)
-        + X[:, 2] * police_bonus,      # police_count (police presence)
-        1, 10
-    )
+    weights = np.array([
+        -incident_penalty,  # incident_count (crime)
+        camera_bonus,       # camera_count (surveillance)
+        police_bonus,       # police_count (police presence)
+    ])
+    
+    stat = os.stat(GRID_PATH)
+    summarize = Memory(CACHE_DIR, verbose=0).cache(summarize_training_data)
+    data = summarize(GRID_PATH, stat.st_mtime_ns, stat.st_size, weights, base_score)
+    print(f"SUCCESS: Loaded {data['n']} grid cells with location-specific features")
     
-    print(f"   Safety score range: {y.min():.2f} to {y.max():.2f}")
-    print(f"   Mean safety score: {y.mean():.2f}")
+    print(f"   Safety score range: {data['y_min']:.2f} to {data['y_max']:.2f}")
+    print(f"   Mean safety score: {data['y_mean']:.2f}")
     
     # Train the model
+    if CLOSED_FORM and not data["clipped"]:
+        coef, intercept = weights.copy(), np.float64(base_score)
+        print("   No labels clipped, using the formula weights directly")
+    else:
+        # Least squares via the normal equations: with three well-conditioned
+        # features a 4x4 solve is all that's needed, instead of
+        # LinearRegression.fit()'s SVD over every row
+        beta = np.linalg.solve(data["A"], data["b"])
+        coef, intercept = beta[:-1], beta[-1]
+    
     model = LinearRegression()
-    model.fit(X, y)
+    model.coef_ = coef
+    model.intercept_ = intercept
+    model.n_features_in_ = len(FEATURE_COLUMNS)
+    model.rank_ = len(FEATURE_COLUMNS)
     
     # Save the model with protocol 4 for maximum compatibility
     # Protocol 4 works with Python 2.7+ and all Python 3.x versions
     # This ensures compatibility between Python 3.14 (local) and Python 3.13 (Render)
-    model_path = os.path.join(BASE_DIR, "safety_model.pkl")
-    import pickle
-    # Use protocol 4 for maximum compatibility across Python versions
-    joblib.dump(model, model_path, protocol=4)
-    print(f"SUCCESS: Safety ML model trained & saved to {model_path} (protocol 4, maximum compatibility)")
+    # A handful of floats, so plain pickle is enough (joblib.load in app.py
+    # reads it just the same)
+    with open(MODEL_PATH, "wb") as f:
+        pickle.dump(model, f, protocol=4)
+    print(f"SUCCESS: Safety ML model trained & saved to {MODEL_PATH} (protocol 4, maximum compatibility)")
+    
+    with open(MODEL_JSON_PATH, "w") as f:
+        json.dump({
+            "features": FEATURE_COLUMNS,
+            "coef": [float(c) for c in model.coef_],
+            "intercept": float(model.intercept_),
+        }, f, indent=2)
+    print(f"SUCCESS: Model coefficients saved to {MODEL_JSON_PATH}")
     
     # Show model coefficients to understand feature importance
     print(f"\nModel coefficients (feature importance):")
@@ -71,4 +285,8 @@ def train_model():
 
 
 if __name__ == "__main__":
+    # Fix encoding for Windows console
+    if sys.platform == 'win32':
+        sys.stdout.reconfigure(encoding='utf-8')
+        sys.stderr.reconfigure(encoding='utf-8')
     train_model()